@@ -0,0 +1,73 @@
+import functools
+import logging
+import time
+from typing import Dict, FrozenSet, List
+from sqlmodel import Session, select
+from app.database import get_session
+from app.models import Allergen, AllergenCreate
+
+logger = logging.getLogger(__name__)
+
+# How long a name that is still unknown after a cache reload is skipped without reloading again
+UNKNOWN_ALLERGEN_RETRY_SECONDS = 300.0
+
+# Unknown name -> time.monotonic() deadline before which it does not trigger another reload
+_unknown_allergen_names: Dict[str, float] = {}
+
+
+@functools.lru_cache(maxsize=1)
+def allergen_name_to_id() -> Dict[str, int]:
+    """Name -> id map of the allergen reference table, loaded once per process.
+
+    The table holds a few dozen rarely-changing rows, so ingest resolves detections from this map
+    instead of querying per allergen. create_allergen() invalidates it, and resolve_allergen_ids() reloads it
+    once on a miss to pick up rows added by other workers; treat the result as read-only.
+    """
+    with get_session() as session:
+        rows = session.exec(select(Allergen.name, Allergen.id)).all()
+    return {name: allergen_id for name, allergen_id in rows if allergen_id is not None}
+
+
+@functools.lru_cache(maxsize=1)
+def common_allergen_ids() -> FrozenSet[int]:
+    """Ids of allergens flagged is_common, cached alongside allergen_name_to_id()."""
+    with get_session() as session:
+        return frozenset(session.exec(select(Allergen.id).where(Allergen.is_common)).all())  # type: ignore[arg-type]
+
+
+def clear_allergen_caches() -> None:
+    allergen_name_to_id.cache_clear()
+    common_allergen_ids.cache_clear()
+    _unknown_allergen_names.clear()
+
+
+def resolve_allergen_ids(names: List[str]) -> Dict[str, int]:
+    """Map detected allergen names to ids, normally without a database round trip.
+
+    A name missing from the cache triggers one reload (it may have been added by another process);
+    names still unknown after that are skipped, and only trigger another reload once
+    UNKNOWN_ALLERGEN_RETRY_SECONDS have passed.
+    """
+    lookup = allergen_name_to_id()
+    now = time.monotonic()
+    missing = [name for name in names if name not in lookup and _unknown_allergen_names.get(name, 0.0) <= now]
+    if missing:
+        allergen_name_to_id.cache_clear()
+        common_allergen_ids.cache_clear()
+        lookup = allergen_name_to_id()
+        for name in missing:
+            if name not in lookup:
+                _unknown_allergen_names[name] = now + UNKNOWN_ALLERGEN_RETRY_SECONDS
+    unknown = [name for name in names if name not in lookup]
+    if unknown:
+        logger.warning("Ignoring unknown allergens: %s", ", ".join(unknown))
+    return {name: lookup[name] for name in names if name in lookup}
+
+
+def create_allergen(session: Session, data: AllergenCreate) -> Allergen:
+    allergen = Allergen(**data.model_dump())
+    session.add(allergen)
+    session.commit()
+    session.refresh(allergen)
+    clear_allergen_caches()
+    return allergen
@@ -0,0 +1,242 @@
+from decimal import Decimal
+from typing import Any, List, Optional
+import orjson
+from sqlmodel import Session, select, asc, desc, text, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.allergen_service import common_allergen_ids, resolve_allergen_ids
+from app.database import bulk_insert, lift_statement_timeout
+from app.models import (
+    AllergenSeverity,
+    AnalysisAllergen,
+    AnalysisAllergenCreate,
+    AnalysisStatus,
+    AnalysisSummary,
+    FoodImage,
+    NutritionalAnalysis,
+    NutritionalAnalysisCreate,
+    NutritionalAnalysisResponse,
+    RESPONSE_COLUMNS,
+    analysis_list_options,
+)
+
+
+def build_analysis_response(analysis: NutritionalAnalysis) -> NutritionalAnalysisResponse:
+    """Convert a loaded analysis into its API response, including allergen names."""
+    if analysis.created_at is None:
+        raise ValueError("Analysis must be persisted before building a response")
+
+    return NutritionalAnalysisResponse.model_validate(analysis)
+
+
+def _user_analyses_query(user_id: int):
+    return (
+        select(*RESPONSE_COLUMNS)
+        .join(FoodImage, FoodImage.id == NutritionalAnalysis.food_image_id)  # type: ignore[arg-type]
+        .where(FoodImage.user_id == user_id)
+        .order_by(desc(NutritionalAnalysis.created_at))
+    )
+
+
+def get_analysis_response(session: Session, food_image_id: int) -> Optional[NutritionalAnalysisResponse]:
+    """One analysis as its API response, read as an entity under analysis_list_options() in a single query."""
+    query = (
+        select(NutritionalAnalysis)
+        .where(NutritionalAnalysis.food_image_id == food_image_id)
+        .options(*analysis_list_options())
+    )
+    analysis = session.exec(query).first()
+    return build_analysis_response(analysis) if analysis is not None else None
+
+
+def list_user_analyses(session: Session, user_id: int) -> List[NutritionalAnalysisResponse]:
+    """Newest-first analyses for one user, selecting only the response columns.
+
+    Rows come from our own typed columns, so responses are built with model_construct() and skip
+    Pydantic validation entirely.
+    """
+    rows = session.exec(_user_analyses_query(user_id)).all()
+    return [NutritionalAnalysisResponse.model_construct(**row._asdict()) for row in rows]
+
+
+async def list_user_analyses_async(session: AsyncSession, user_id: int) -> List[NutritionalAnalysisResponse]:
+    """list_user_analyses() for async endpoints; the event loop stays free while PostgreSQL runs the query."""
+    rows = (await session.exec(_user_analyses_query(user_id))).all()
+    return [NutritionalAnalysisResponse.model_construct(**row._asdict()) for row in rows]
+
+
+async def get_analysis_async(session: AsyncSession, food_image_id: int) -> Optional[NutritionalAnalysis]:
+    """One analysis with its allergen links eagerly loaded; await awaitable_attrs for lazy relationships.
+
+    raw_response is deferred on the mapper; await awaitable_attrs.raw_response if needed.
+    """
+    query = select(NutritionalAnalysis).where(NutritionalAnalysis.food_image_id == food_image_id)
+    return (await session.exec(query)).first()
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)  # same as Pydantic's JSON mode
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dump_user_analyses(session: Session, user_id: int) -> bytes:
+    """Byte-for-byte the JSON of list_user_analyses() responses, encoded by orjson straight from the SELECT rows.
+
+    For endpoints that only serialize: no response models are built at all.
+    """
+    rows = session.exec(_user_analyses_query(user_id)).all()
+    # OPT_UTC_Z writes UTC timestamps with a "Z" suffix, as Pydantic does
+    return orjson.dumps([row._asdict() for row in rows], default=_json_default, option=orjson.OPT_UTC_Z)
+
+
+def create_analysis(
+    session: Session,
+    data: NutritionalAnalysisCreate,
+    allergen_names: Optional[List[str]] = None,
+    severity: AllergenSeverity = AllergenSeverity.LOW,
+) -> NutritionalAnalysis:
+    """Persist an analysis and its detected allergens.
+
+    Flat nutrient fields are folded into the nutrients JSONB column. Detected allergen names are
+    resolved through the in-process allergen cache and all links are written with a single batched
+    INSERT, so ingest does no per-allergen queries.
+    """
+    analysis = NutritionalAnalysis(**data.model_dump())
+    allergen_ids = resolve_allergen_ids(allergen_names or [])
+    common_ids = common_allergen_ids()
+    analysis.allergen_names = sorted(allergen_ids)
+    analysis.has_common_allergens = any(allergen_id in common_ids for allergen_id in allergen_ids.values())
+    session.add(analysis)
+    session.flush()
+
+    rows = [
+        {"analysis_id": analysis.food_image_id, "allergen_id": allergen_id, "severity": severity}
+        for allergen_id in allergen_ids.values()
+    ]
+    bulk_insert(session, AnalysisAllergen, rows)
+
+    session.commit()
+    session.refresh(analysis)
+    return analysis
+
+
+def claim_pending_analyses(session: Session, limit: int = 10) -> List[NutritionalAnalysis]:
+    """Move the oldest pending analyses to processing and return them for a worker, oldest first.
+
+    One UPDATE ... WHERE food_image_id IN (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING food_image_id claims the
+    rows: several workers can poll concurrently without claiming the same rows, and the lookup is served by the
+    partial ix_nutritional_analyses_pending_created_at index. The claimed analyses are then read back with one
+    SELECT (plus the selectin load of their allergen links), so the statement count does not grow with limit.
+    """
+    pending = (
+        select(NutritionalAnalysis.food_image_id)
+        .where(NutritionalAnalysis.status == AnalysisStatus.PENDING)
+        .order_by(asc(NutritionalAnalysis.created_at))
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claim = (
+        update(NutritionalAnalysis)
+        .where(NutritionalAnalysis.food_image_id.in_(pending.scalar_subquery()))  # type: ignore[attr-defined]
+        .values(status=AnalysisStatus.PROCESSING)
+        .returning(NutritionalAnalysis.food_image_id)  # type: ignore[arg-type]
+        .execution_options(synchronize_session=False)
+    )
+    claimed_ids = list(session.scalars(claim).all())
+    session.commit()
+    if not claimed_ids:
+        return []
+
+    query = (
+        select(NutritionalAnalysis)
+        .where(NutritionalAnalysis.food_image_id.in_(claimed_ids))  # type: ignore[attr-defined]
+        .order_by(asc(NutritionalAnalysis.created_at))
+    )
+    return list(session.exec(query).all())
+
+
+def sync_allergen_fields(session: Session, analysis: NutritionalAnalysis) -> None:
+    """Recompute the denormalized allergen_names and has_common_allergens from the analysis_allergens rows."""
+    session.flush()
+    session.refresh(analysis, attribute_names=["allergens"])
+    analysis.allergen_names = sorted(link.allergen.name for link in analysis.allergens)
+    analysis.has_common_allergens = any(link.allergen.is_common for link in analysis.allergens)
+    session.add(analysis)
+
+
+def add_analysis_allergen(session: Session, data: AnalysisAllergenCreate) -> AnalysisAllergen:
+    analysis = session.get(NutritionalAnalysis, data.analysis_id)
+    if analysis is None:
+        raise ValueError(f"Analysis {data.analysis_id} not found")
+
+    link = AnalysisAllergen(**data.model_dump())
+    session.add(link)
+    sync_allergen_fields(session, analysis)
+    session.commit()
+    session.refresh(link)
+    return link
+
+
+def remove_analysis_allergen(session: Session, analysis_allergen_id: int) -> bool:
+    link = session.get(AnalysisAllergen, analysis_allergen_id)
+    if link is None:
+        return False
+
+    analysis = session.get(NutritionalAnalysis, link.analysis_id)
+    session.delete(link)
+    if analysis is not None:
+        sync_allergen_fields(session, analysis)
+    session.commit()
+    return True
+
+
+def backfill_allergen_fields(session: Session) -> int:
+    """One-shot rebuild of allergen_names and has_common_allergens for every analysis from the join tables.
+
+    Rewrites every row, so it runs without the statement timeout.
+    """
+    lift_statement_timeout(session)
+    result = session.execute(
+        text("""
+            UPDATE nutritional_analyses na
+            SET allergen_names = COALESCE(
+                (
+                    SELECT json_agg(a.name ORDER BY a.name)
+                    FROM analysis_allergens aa
+                    JOIN allergens a ON a.id = aa.allergen_id
+                    WHERE aa.analysis_id = na.food_image_id
+                ),
+                '[]'::json
+            ),
+            has_common_allergens = EXISTS (
+                SELECT 1
+                FROM analysis_allergens aa
+                JOIN allergens a ON a.id = aa.allergen_id
+                WHERE aa.analysis_id = na.food_image_id AND a.is_common
+            )
+        """)
+    )
+    session.commit()
+    return result.rowcount  # type: ignore[attr-defined]  # CursorResult for DML
+
+
+def refresh_analysis_summary(session: Session) -> None:
+    """Rebuild the analysis_summary materialized view without blocking dashboard readers.
+
+    Intended to run on a schedule (or after a batch of ingests), not on every write. The refresh re-runs the
+    whole view query, so it runs without the statement timeout.
+    """
+    lift_statement_timeout(session)
+    session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY analysis_summary"))
+    session.commit()
+
+
+def get_recent_summaries(session: Session, user_id: int, limit: int = 30) -> List[AnalysisSummary]:
+    """Dashboard rows for a user's latest analyses, as of the last refresh."""
+    query = (
+        select(AnalysisSummary)
+        .where(AnalysisSummary.user_id == user_id)
+        .order_by(desc(AnalysisSummary.uploaded_at))
+        .limit(limit)
+    )
+    return list(session.exec(query).all())
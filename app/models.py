@@ -1,6 +1,12 @@
-from sqlmodel import SQLModel, Field, Relationship, JSON, Column
+from sqlmodel import SQLModel, Field, Relationship, JSON, CheckConstraint, Column, DateTime, Index, func, text
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field as PydanticField, model_validator
+from sqlalchemy import DDL, Enum as SAEnum, String, event
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.ext.asyncio import AsyncAttrs
+from sqlalchemy.orm import defer, deferred, raiseload, registry
+from sqlalchemy.orm.interfaces import LoaderOption
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from decimal import Decimal
 from enum import Enum
 
@@ -20,24 +26,69 @@ class AllergenSeverity(str, Enum):
     SEVERE = "severe"
 
 
+class MimeType(str, Enum):
+    JPEG = "image/jpeg"
+    PNG = "image/png"
+    WEBP = "image/webp"
+    HEIC = "image/heic"
+
+
+# Native PostgreSQL ENUM types labelled with the enum values ("pending", "low", ...), shared across columns
+ANALYSIS_STATUS_TYPE = SAEnum(
+    AnalysisStatus, name="analysis_status", values_callable=lambda members: [member.value for member in members]
+)
+ALLERGEN_SEVERITY_TYPE = SAEnum(
+    AllergenSeverity, name="allergen_severity", values_callable=lambda members: [member.value for member in members]
+)
+MIME_TYPE_TYPE = SAEnum(
+    MimeType, name="mime_type", values_callable=lambda members: [member.value for member in members]
+)
+
+# Shared by the users CHECK constraint (PostgreSQL regex) and the input schemas (Pydantic)
+EMAIL_PATTERN = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9.-]+$"
+
+
 # Persistent models (stored in database)
-class User(SQLModel, table=True):
+#
+# Timestamps are filled by PostgreSQL (server_default=now(), updated_at also refreshed via onupdate), so
+# inserts never build Python datetimes; they are None on a new instance until it has been flushed.
+#
+# Loading strategy: relationships on the list-view path (food image -> analysis -> allergens -> allergen)
+# are eager so serializing N analyses costs a fixed number of queries instead of N round trips.
+# Collections use "selectin" (one extra IN query per level); the many-to-one AnalysisAllergen.allergen
+# is "joined" into that same selectin query. Everything else, e.g. User.food_images, stays lazy to
+# avoid over-fetching on unrelated queries.
+#
+# Under AsyncSession a lazy relationship must not load on plain attribute access (it would need implicit
+# IO); TableModel adds AsyncAttrs so it can be awaited instead: await analysis.awaitable_attrs.food_image.
+class TableModel(AsyncAttrs, SQLModel):
+    pass
+
+
+class User(TableModel, table=True):
     __tablename__ = "users"  # type: ignore[assignment]
 
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(max_length=50, unique=True)
-    email: str = Field(unique=True, max_length=255, regex=r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+    email: str = Field(unique=True, max_length=255)  # format enforced by the users_email_format CHECK
     full_name: Optional[str] = Field(default=None, max_length=100)
     is_active: bool = Field(default=True)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )
+    updated_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False),
+    )
 
     # Relationships
     food_images: List["FoodImage"] = Relationship(back_populates="user")
     user_allergens: List["UserAllergen"] = Relationship(back_populates="user")
 
+    __table_args__ = (CheckConstraint(f"email ~ '{EMAIL_PATTERN}'", name="users_email_format"),)
 
-class FoodImage(SQLModel, table=True):
+
+class FoodImage(TableModel, table=True):
     __tablename__ = "food_images"  # type: ignore[assignment]
 
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -45,61 +96,113 @@ class FoodImage(SQLModel, table=True):
     filename: str = Field(max_length=255)
     file_path: str = Field(max_length=500)
     file_size: int = Field(gt=0)  # Size in bytes
-    mime_type: str = Field(max_length=100)
+    mime_type: MimeType = Field(sa_column=Column(MIME_TYPE_TYPE, nullable=False))
     original_filename: Optional[str] = Field(default=None, max_length=255)
     description: Optional[str] = Field(default=None, max_length=1000)
-    uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    uploaded_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )
 
     # Relationships
     user: User = Relationship(back_populates="food_images")
-    nutritional_analysis: Optional["NutritionalAnalysis"] = Relationship(back_populates="food_image")
+    nutritional_analysis: Optional["NutritionalAnalysis"] = Relationship(
+        back_populates="food_image", sa_relationship_kwargs={"lazy": "selectin"}
+    )
+
+
+# Nutrient keys stored in NutritionalAnalysis.nutrients
+NUTRIENT_FIELDS: Tuple[str, ...] = (
+    # Macronutrients: calories in kcal, sodium in mg, the rest in grams
+    "calories",
+    "protein",
+    "carbohydrates",
+    "total_fat",
+    "saturated_fat",
+    "fiber",
+    "sugar",
+    "sodium",
+    # Vitamins (in mg or mcg as appropriate)
+    "vitamin_a",
+    "vitamin_c",
+    "vitamin_d",
+    "vitamin_e",
+    "vitamin_k",
+    "vitamin_b1",
+    "vitamin_b2",
+    "vitamin_b3",
+    "vitamin_b6",
+    "vitamin_b12",
+    "folate",
+    # Minerals (in mg or mcg as appropriate)
+    "calcium",
+    "iron",
+    "magnesium",
+    "phosphorus",
+    "potassium",
+    "zinc",
+)
+
+
+def _fold_nutrient_kwargs(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Move flat nutrient arguments (calories=..., ...) into a nutrients dict as floats, dropping None values."""
+    if not any(name in data for name in NUTRIENT_FIELDS):
+        return data
+    data = dict(data)
+    nutrients = dict(data.pop("nutrients", None) or {})
+    for name in NUTRIENT_FIELDS:
+        value = data.pop(name, None)
+        if value is not None:
+            nutrients[name] = float(value)  # JSONB holds numbers; Decimal would fail to serialize at flush
+    return {**data, "nutrients": nutrients}
+
+
+def _nutrient_property(name: str) -> Any:
+    """Read/write view of one key in NutritionalAnalysis.nutrients; None removes the key."""
+
+    def getter(self: "NutritionalAnalysis") -> Optional[float]:
+        return self.nutrients.get(name)
+
+    def setter(self: "NutritionalAnalysis", value: Optional[float]) -> None:
+        nutrients = {key: amount for key, amount in self.nutrients.items() if key != name}
+        if value is not None:
+            nutrients[name] = float(value)
+        # Reassign rather than mutate so the JSONB change is picked up on flush
+        self.nutrients = nutrients
+
+    return property(getter, setter)
+
+
+# Full AI model dump; large and rarely read, so the mapper defers it: entity loads (including the
+# FoodImage.nutritional_analysis selectin and session.get()) skip it and reading the attribute fetches it
+_RAW_RESPONSE_COLUMN = Column("raw_response", JSONB)
 
 
-class NutritionalAnalysis(SQLModel, table=True):
+class NutritionalAnalysis(TableModel, table=True):
     __tablename__ = "nutritional_analyses"  # type: ignore[assignment]
 
-    id: Optional[int] = Field(default=None, primary_key=True)
-    food_image_id: int = Field(foreign_key="food_images.id", unique=True)
-    status: AnalysisStatus = Field(default=AnalysisStatus.PENDING)
+    # Shared primary key: an analysis is identified by the food image it belongs to (1:1)
+    food_image_id: int = Field(
+        foreign_key="food_images.id", primary_key=True, sa_column_kwargs={"autoincrement": False}
+    )
+    status: AnalysisStatus = Field(
+        default=AnalysisStatus.PENDING,
+        sa_column=Column(
+            ANALYSIS_STATUS_TYPE, nullable=False, default=AnalysisStatus.PENDING, server_default=text("'pending'")
+        ),
+    )
 
     # Food identification
     food_name: Optional[str] = Field(default=None, max_length=200)
     food_category: Optional[str] = Field(default=None, max_length=100)
     confidence_score: Optional[Decimal] = Field(default=None, decimal_places=4, max_digits=5)  # 0.0000 to 1.0000
 
-    # Nutritional values per 100g
-    calories: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # kcal
-    protein: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # grams
-    carbohydrates: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # grams
-    total_fat: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # grams
-    saturated_fat: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # grams
-    fiber: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # grams
-    sugar: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # grams
-    sodium: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # mg
-
-    # Vitamins (in mg or mcg as appropriate)
-    vitamin_a: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_c: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_d: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_e: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_k: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_b1: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_b2: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_b3: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_b6: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    vitamin_b12: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    folate: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-
-    # Minerals (in mg or mcg as appropriate)
-    calcium: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    iron: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    magnesium: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    phosphorus: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    potassium: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
-    zinc: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)
+    # Nutritional values per 100g, keyed by NUTRIENT_FIELDS; only detected nutrients are stored
+    nutrients: Dict[str, float] = Field(
+        default_factory=dict, sa_column=Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    )
 
     # Estimated portion information
-    estimated_weight: Optional[Decimal] = Field(default=None, decimal_places=2, max_digits=8)  # grams
+    estimated_weight: Optional[float] = Field(default=None)  # grams
     serving_size: Optional[str] = Field(default=None, max_length=100)
 
     # Analysis metadata
@@ -107,17 +210,77 @@ class NutritionalAnalysis(SQLModel, table=True):
     analysis_version: Optional[str] = Field(default=None, max_length=50)
     processing_time: Optional[Decimal] = Field(default=None, decimal_places=3, max_digits=8)  # seconds
     error_message: Optional[str] = Field(default=None, max_length=1000)
-    raw_response: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
-
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    raw_response: Optional[Dict[str, Any]] = Field(default=None, sa_column=_RAW_RESPONSE_COLUMN)
+
+    # Denormalized from allergens[] for single-table reads; kept in sync by analysis_service
+    allergen_names: List[str] = Field(
+        default_factory=list, sa_column=Column(JSON, nullable=False, server_default=text("'[]'"))
+    )
+    has_common_allergens: bool = Field(default=False, index=True)  # any linked allergen with is_common
+
+    created_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )
+    updated_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False),
+    )
 
     # Relationships
     food_image: FoodImage = Relationship(back_populates="nutritional_analysis")
-    allergens: List["AnalysisAllergen"] = Relationship(back_populates="analysis")
-
-
-class Allergen(SQLModel, table=True):
+    allergens: List["AnalysisAllergen"] = Relationship(
+        back_populates="analysis", sa_relationship_kwargs={"lazy": "selectin"}
+    )
+
+    # Flat nutrient arguments keep working: NutritionalAnalysis(calories=52.5) stores {"calories": 52.5}
+    def __init__(self, **data: Any) -> None:
+        super().__init__(**_fold_nutrient_kwargs(data))
+
+    @model_validator(mode="before")
+    @classmethod
+    def _fold_nutrients(cls, data: Any) -> Any:
+        return _fold_nutrient_kwargs(data) if isinstance(data, dict) else data
+
+    # Per-nutrient accessors over `nutrients`, so analysis.calories etc. keep working
+    calories = _nutrient_property("calories")
+    protein = _nutrient_property("protein")
+    carbohydrates = _nutrient_property("carbohydrates")
+    total_fat = _nutrient_property("total_fat")
+    saturated_fat = _nutrient_property("saturated_fat")
+    fiber = _nutrient_property("fiber")
+    sugar = _nutrient_property("sugar")
+    sodium = _nutrient_property("sodium")
+    vitamin_a = _nutrient_property("vitamin_a")
+    vitamin_c = _nutrient_property("vitamin_c")
+    vitamin_d = _nutrient_property("vitamin_d")
+    vitamin_e = _nutrient_property("vitamin_e")
+    vitamin_k = _nutrient_property("vitamin_k")
+    vitamin_b1 = _nutrient_property("vitamin_b1")
+    vitamin_b2 = _nutrient_property("vitamin_b2")
+    vitamin_b3 = _nutrient_property("vitamin_b3")
+    vitamin_b6 = _nutrient_property("vitamin_b6")
+    vitamin_b12 = _nutrient_property("vitamin_b12")
+    folate = _nutrient_property("folate")
+    calcium = _nutrient_property("calcium")
+    iron = _nutrient_property("iron")
+    magnesium = _nutrient_property("magnesium")
+    phosphorus = _nutrient_property("phosphorus")
+    potassium = _nutrient_property("potassium")
+    zinc = _nutrient_property("zinc")
+
+    __table_args__ = (
+        Index("ix_nutritional_analyses_nutrients", "nutrients", postgresql_using="gin"),
+        # Worker queue: sized by queue depth rather than total analyses
+        Index(
+            "ix_nutritional_analyses_pending_created_at",
+            "created_at",
+            postgresql_where=text("status IN ('pending', 'processing')"),
+        ),
+    )
+    __mapper_args__ = {"properties": {"raw_response": deferred(_RAW_RESPONSE_COLUMN)}}
+
+
+class Allergen(TableModel, table=True):
     __tablename__ = "allergens"  # type: ignore[assignment]
 
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -125,54 +288,156 @@ class Allergen(SQLModel, table=True):
     category: Optional[str] = Field(default=None, max_length=50)  # e.g., "Tree Nuts", "Dairy"
     description: Optional[str] = Field(default=None, max_length=500)
     is_common: bool = Field(default=False)  # Flag for common allergens (top 8/14)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )
 
     # Relationships
     analysis_allergens: List["AnalysisAllergen"] = Relationship(back_populates="allergen")
     user_allergens: List["UserAllergen"] = Relationship(back_populates="allergen")
 
 
-class AnalysisAllergen(SQLModel, table=True):
+class AnalysisAllergen(TableModel, table=True):
     __tablename__ = "analysis_allergens"  # type: ignore[assignment]
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    analysis_id: int = Field(foreign_key="nutritional_analyses.id")
+    analysis_id: int = Field(foreign_key="nutritional_analyses.food_image_id")
     allergen_id: int = Field(foreign_key="allergens.id")
-    severity: AllergenSeverity = Field(default=AllergenSeverity.LOW)
+    severity: AllergenSeverity = Field(
+        default=AllergenSeverity.LOW,
+        sa_column=Column(
+            ALLERGEN_SEVERITY_TYPE, nullable=False, default=AllergenSeverity.LOW, server_default=text("'low'")
+        ),
+    )
     confidence: Optional[Decimal] = Field(default=None, decimal_places=4, max_digits=5)  # 0.0000 to 1.0000
     notes: Optional[str] = Field(default=None, max_length=500)
-    detected_at: datetime = Field(default_factory=datetime.utcnow)
+    detected_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )
 
     # Relationships
     analysis: NutritionalAnalysis = Relationship(back_populates="allergens")
-    allergen: Allergen = Relationship(back_populates="analysis_allergens")
+    allergen: Allergen = Relationship(
+        back_populates="analysis_allergens", sa_relationship_kwargs={"lazy": "joined", "innerjoin": True}
+    )
+
+    # Cover both join directions; the unique one also rejects duplicate detections
+    __table_args__ = (
+        Index("ix_analysis_allergens_analysis_id_allergen_id", "analysis_id", "allergen_id", unique=True),
+        Index("ix_analysis_allergens_allergen_id_analysis_id", "allergen_id", "analysis_id"),
+    )
 
 
-class UserAllergen(SQLModel, table=True):
+class UserAllergen(TableModel, table=True):
     __tablename__ = "user_allergens"  # type: ignore[assignment]
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
     allergen_id: int = Field(foreign_key="allergens.id")
-    severity: AllergenSeverity = Field(default=AllergenSeverity.MEDIUM)
+    severity: AllergenSeverity = Field(
+        default=AllergenSeverity.MEDIUM,
+        sa_column=Column(
+            ALLERGEN_SEVERITY_TYPE, nullable=False, default=AllergenSeverity.MEDIUM, server_default=text("'medium'")
+        ),
+    )
     notes: Optional[str] = Field(default=None, max_length=500)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )
 
     # Relationships
     user: User = Relationship(back_populates="user_allergens")
     allergen: Allergen = Relationship(back_populates="user_allergens")
 
+    # Cover both join directions; the unique one also rejects duplicate user allergies
+    __table_args__ = (
+        Index("ix_user_allergens_user_id_allergen_id", "user_id", "allergen_id", unique=True),
+        Index("ix_user_allergens_allergen_id_user_id", "allergen_id", "user_id"),
+    )
+
+
+# Read-only dashboard view (materialized in PostgreSQL, never written through the ORM).
+# Views live in their own registry so create_all()/drop_all() don't treat them as tables; the DDL
+# below creates the view after the tables and drops it before them.
+class ViewModel(SQLModel, registry=registry()):
+    pass
+
+
+ANALYSIS_SUMMARY_VIEW_DDL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS analysis_summary AS
+SELECT
+    na.food_image_id,
+    na.food_name,
+    (na.nutrients ->> 'calories')::double precision AS calories,
+    fi.user_id,
+    fi.uploaded_at,
+    COALESCE(array_agg(a.name ORDER BY a.name) FILTER (WHERE a.name IS NOT NULL), ARRAY[]::varchar[])
+        AS allergen_names
+FROM nutritional_analyses na
+JOIN food_images fi ON fi.id = na.food_image_id
+LEFT JOIN analysis_allergens aa ON aa.analysis_id = na.food_image_id
+LEFT JOIN allergens a ON a.id = aa.allergen_id
+GROUP BY na.food_image_id, fi.user_id, fi.uploaded_at
+"""
+
+
+class AnalysisSummary(ViewModel, table=True):
+    __tablename__ = "analysis_summary"  # type: ignore[assignment]
+
+    food_image_id: int = Field(primary_key=True)
+    food_name: Optional[str] = Field(default=None)
+    calories: Optional[float] = Field(default=None)
+    user_id: int
+    uploaded_at: datetime = Field(sa_column=Column(DateTime(timezone=True)))
+    allergen_names: List[str] = Field(default_factory=list, sa_column=Column(ARRAY(String)))
+
+
+# The unique index is what allows REFRESH MATERIALIZED VIEW CONCURRENTLY
+for _statement in (
+    ANALYSIS_SUMMARY_VIEW_DDL,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_analysis_summary_food_image_id ON analysis_summary (food_image_id)",
+    "CREATE INDEX IF NOT EXISTS ix_analysis_summary_user_id_uploaded_at"
+    " ON analysis_summary (user_id, uploaded_at DESC)",
+):
+    event.listen(SQLModel.metadata, "after_create", DDL(_statement))
+event.listen(SQLModel.metadata, "before_drop", DDL("DROP MATERIALIZED VIEW IF EXISTS analysis_summary"))
+
+
+# Compress raw_response with lz4 where the server supports it, else keep pglz: servers built without lz4 raise
+# feature_not_supported, and PostgreSQL 13 and older, which lack SET COMPRESSION, raise syntax_error
+event.listen(
+    NutritionalAnalysis.__table__,  # type: ignore[attr-defined]
+    "after_create",
+    DDL("""
+        DO $$
+        BEGIN
+            ALTER TABLE nutritional_analyses ALTER COLUMN raw_response SET COMPRESSION lz4;
+        EXCEPTION WHEN feature_not_supported OR syntax_error THEN
+            NULL;
+        END
+        $$
+    """),
+)
+
+
+def analysis_list_options() -> List[LoaderOption]:
+    """Loader options for serializing analyses.
+
+    Responses read allergen_names, so any lazy load raises, and the TOASTed raw_response is never fetched.
+    """
+    return [defer(NutritionalAnalysis.raw_response, raiseload=True), raiseload("*")]  # type: ignore[arg-type]
+
 
 # Non-persistent schemas (for validation, forms, API requests/responses)
 class UserCreate(SQLModel, table=False):
     username: str = Field(max_length=50)
-    email: str = Field(max_length=255)
+    email: str = Field(max_length=255, schema_extra={"pattern": EMAIL_PATTERN})
     full_name: Optional[str] = Field(default=None, max_length=100)
 
 
 class UserUpdate(SQLModel, table=False):
     username: Optional[str] = Field(default=None, max_length=50)
-    email: Optional[str] = Field(default=None, max_length=255)
+    email: Optional[str] = Field(default=None, max_length=255, schema_extra={"pattern": EMAIL_PATTERN})
     full_name: Optional[str] = Field(default=None, max_length=100)
     is_active: Optional[bool] = Field(default=None)
 
@@ -181,7 +446,7 @@ class FoodImageUpload(SQLModel, table=False):
     filename: str = Field(max_length=255)
     file_path: str = Field(max_length=500)
     file_size: int = Field(gt=0)
-    mime_type: str = Field(max_length=100)
+    mime_type: MimeType
     original_filename: Optional[str] = Field(default=None, max_length=255)
     description: Optional[str] = Field(default=None, max_length=1000)
 
@@ -193,38 +458,38 @@ class NutritionalAnalysisCreate(SQLModel, table=False):
     confidence_score: Optional[Decimal] = Field(default=None)
 
     # Nutritional values
-    calories: Optional[Decimal] = Field(default=None)
-    protein: Optional[Decimal] = Field(default=None)
-    carbohydrates: Optional[Decimal] = Field(default=None)
-    total_fat: Optional[Decimal] = Field(default=None)
-    saturated_fat: Optional[Decimal] = Field(default=None)
-    fiber: Optional[Decimal] = Field(default=None)
-    sugar: Optional[Decimal] = Field(default=None)
-    sodium: Optional[Decimal] = Field(default=None)
+    calories: Optional[float] = Field(default=None)
+    protein: Optional[float] = Field(default=None)
+    carbohydrates: Optional[float] = Field(default=None)
+    total_fat: Optional[float] = Field(default=None)
+    saturated_fat: Optional[float] = Field(default=None)
+    fiber: Optional[float] = Field(default=None)
+    sugar: Optional[float] = Field(default=None)
+    sodium: Optional[float] = Field(default=None)
 
     # Vitamins
-    vitamin_a: Optional[Decimal] = Field(default=None)
-    vitamin_c: Optional[Decimal] = Field(default=None)
-    vitamin_d: Optional[Decimal] = Field(default=None)
-    vitamin_e: Optional[Decimal] = Field(default=None)
-    vitamin_k: Optional[Decimal] = Field(default=None)
-    vitamin_b1: Optional[Decimal] = Field(default=None)
-    vitamin_b2: Optional[Decimal] = Field(default=None)
-    vitamin_b3: Optional[Decimal] = Field(default=None)
-    vitamin_b6: Optional[Decimal] = Field(default=None)
-    vitamin_b12: Optional[Decimal] = Field(default=None)
-    folate: Optional[Decimal] = Field(default=None)
+    vitamin_a: Optional[float] = Field(default=None)
+    vitamin_c: Optional[float] = Field(default=None)
+    vitamin_d: Optional[float] = Field(default=None)
+    vitamin_e: Optional[float] = Field(default=None)
+    vitamin_k: Optional[float] = Field(default=None)
+    vitamin_b1: Optional[float] = Field(default=None)
+    vitamin_b2: Optional[float] = Field(default=None)
+    vitamin_b3: Optional[float] = Field(default=None)
+    vitamin_b6: Optional[float] = Field(default=None)
+    vitamin_b12: Optional[float] = Field(default=None)
+    folate: Optional[float] = Field(default=None)
 
     # Minerals
-    calcium: Optional[Decimal] = Field(default=None)
-    iron: Optional[Decimal] = Field(default=None)
-    magnesium: Optional[Decimal] = Field(default=None)
-    phosphorus: Optional[Decimal] = Field(default=None)
-    potassium: Optional[Decimal] = Field(default=None)
-    zinc: Optional[Decimal] = Field(default=None)
+    calcium: Optional[float] = Field(default=None)
+    iron: Optional[float] = Field(default=None)
+    magnesium: Optional[float] = Field(default=None)
+    phosphorus: Optional[float] = Field(default=None)
+    potassium: Optional[float] = Field(default=None)
+    zinc: Optional[float] = Field(default=None)
 
     # Portion information
-    estimated_weight: Optional[Decimal] = Field(default=None)
+    estimated_weight: Optional[float] = Field(default=None)
     serving_size: Optional[str] = Field(default=None, max_length=100)
 
     # Analysis metadata
@@ -262,8 +527,13 @@ class UserAllergenCreate(SQLModel, table=False):
 
 
 # Response schemas for API
-class NutritionalAnalysisResponse(SQLModel, table=False):
-    id: int
+# Plain frozen Pydantic models without field constraints: they are output-only and filled from trusted ORM
+# objects or RESPONSE_COLUMNS rows (model_validate() / model_construct()), immutable once built.
+class NutritionalAnalysisResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True, populate_by_name=True)
+
+    # Former surrogate key, kept for API consumers; analyses are now keyed by food_image_id
+    id: int = PydanticField(validation_alias=AliasChoices("id", "food_image_id"))
     food_image_id: int
     status: AnalysisStatus
     food_name: Optional[str]
@@ -271,32 +541,58 @@ class NutritionalAnalysisResponse(SQLModel, table=False):
     confidence_score: Optional[Decimal]
 
     # Nutritional values
-    calories: Optional[Decimal]
-    protein: Optional[Decimal]
-    carbohydrates: Optional[Decimal]
-    total_fat: Optional[Decimal]
-    fiber: Optional[Decimal]
-    sugar: Optional[Decimal]
-    sodium: Optional[Decimal]
+    calories: Optional[float]
+    protein: Optional[float]
+    carbohydrates: Optional[float]
+    total_fat: Optional[float]
+    fiber: Optional[float]
+    sugar: Optional[float]
+    sodium: Optional[float]
 
     # Key vitamins and minerals
-    vitamin_c: Optional[Decimal]
-    calcium: Optional[Decimal]
-    iron: Optional[Decimal]
+    vitamin_c: Optional[float]
+    calcium: Optional[float]
+    iron: Optional[float]
 
     # Portion information
-    estimated_weight: Optional[Decimal]
+    estimated_weight: Optional[float]
     serving_size: Optional[str]
 
-    created_at: str  # ISO format datetime string
-    allergens: List[str] = Field(default_factory=list)  # Simple allergen names
-
+    created_at: datetime  # serialized as ISO 8601 by Pydantic
+    # Simple allergen names, read from the denormalized NutritionalAnalysis.allergen_names
+    allergens: List[str] = PydanticField(default_factory=list, validation_alias="allergen_names")
+    has_common_allergens: bool = False
+
+
+# Column subset for building NutritionalAnalysisResponse straight from SELECT rows: labels match the response
+# fields, nutrients are extracted from JSONB server-side, and wide columns such as raw_response are never read.
+RESPONSE_COLUMNS: Tuple[Any, ...] = (
+    NutritionalAnalysis.food_image_id.label("id"),  # type: ignore[attr-defined]
+    NutritionalAnalysis.food_image_id,
+    NutritionalAnalysis.status,
+    NutritionalAnalysis.food_name,
+    NutritionalAnalysis.food_category,
+    NutritionalAnalysis.confidence_score,
+    *(
+        NutritionalAnalysis.nutrients[name].as_float().label(name)  # type: ignore[index]
+        for name in NutritionalAnalysisResponse.model_fields
+        if name in NUTRIENT_FIELDS
+    ),
+    NutritionalAnalysis.estimated_weight,
+    NutritionalAnalysis.serving_size,
+    NutritionalAnalysis.created_at,
+    NutritionalAnalysis.allergen_names.label("allergens"),  # type: ignore[attr-defined]
+    NutritionalAnalysis.has_common_allergens,
+)
+
+
+class FoodImageResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
-class FoodImageResponse(SQLModel, table=False):
     id: int
     filename: str
     original_filename: Optional[str]
     file_size: int
     description: Optional[str]
-    uploaded_at: str  # ISO format datetime string
+    uploaded_at: datetime  # serialized as ISO 8601 by Pydantic
     analysis_status: Optional[AnalysisStatus]
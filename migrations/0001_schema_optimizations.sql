@@ -0,0 +1,191 @@
+-- Brings a database created by the original models up to the current schema.
+--
+-- create_tables() only creates missing tables, so databases that already hold data must run this once,
+-- with the app stopped:
+--
+--     psql "$APP_DATABASE_URL" --single-transaction -v ON_ERROR_STOP=1 -f migrations/0001_schema_optimizations.sql
+--
+-- The original models stored naive UTC timestamps (datetime.utcnow) and enum member names ('PENDING').
+-- Rows that violate the new constraints (malformed emails, unsupported mime types, duplicate allergen links)
+-- make the script fail; fix or delete them and re-run.
+
+-- Native enums labelled with the values ('pending', 'low', 'image/jpeg', ...)
+CREATE TYPE analysis_status AS ENUM ('pending', 'processing', 'completed', 'failed');
+CREATE TYPE allergen_severity AS ENUM ('low', 'medium', 'high', 'severe');
+CREATE TYPE mime_type AS ENUM ('image/jpeg', 'image/png', 'image/webp', 'image/heic');
+
+-- users: server-side timestamps, email format check
+ALTER TABLE users
+    ALTER COLUMN created_at TYPE timestamptz USING created_at AT TIME ZONE 'UTC',
+    ALTER COLUMN created_at SET DEFAULT now(),
+    ALTER COLUMN updated_at TYPE timestamptz USING updated_at AT TIME ZONE 'UTC',
+    ALTER COLUMN updated_at SET DEFAULT now(),
+    ADD CONSTRAINT users_email_format CHECK (email ~ '^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9.-]+$');
+
+-- food_images: mime_type enum
+ALTER TABLE food_images
+    ALTER COLUMN mime_type TYPE mime_type USING mime_type::mime_type,
+    ALTER COLUMN uploaded_at TYPE timestamptz USING uploaded_at AT TIME ZONE 'UTC',
+    ALTER COLUMN uploaded_at SET DEFAULT now();
+
+-- allergens
+ALTER TABLE allergens
+    ALTER COLUMN created_at TYPE timestamptz USING created_at AT TIME ZONE 'UTC',
+    ALTER COLUMN created_at SET DEFAULT now();
+
+-- nutritional_analyses: nutrient columns folded into JSONB
+ALTER TABLE nutritional_analyses ADD COLUMN nutrients jsonb NOT NULL DEFAULT '{}'::jsonb;
+UPDATE nutritional_analyses
+SET nutrients = jsonb_strip_nulls(jsonb_build_object(
+    'calories', calories::double precision,
+    'protein', protein::double precision,
+    'carbohydrates', carbohydrates::double precision,
+    'total_fat', total_fat::double precision,
+    'saturated_fat', saturated_fat::double precision,
+    'fiber', fiber::double precision,
+    'sugar', sugar::double precision,
+    'sodium', sodium::double precision,
+    'vitamin_a', vitamin_a::double precision,
+    'vitamin_c', vitamin_c::double precision,
+    'vitamin_d', vitamin_d::double precision,
+    'vitamin_e', vitamin_e::double precision,
+    'vitamin_k', vitamin_k::double precision,
+    'vitamin_b1', vitamin_b1::double precision,
+    'vitamin_b2', vitamin_b2::double precision,
+    'vitamin_b3', vitamin_b3::double precision,
+    'vitamin_b6', vitamin_b6::double precision,
+    'vitamin_b12', vitamin_b12::double precision,
+    'folate', folate::double precision,
+    'calcium', calcium::double precision,
+    'iron', iron::double precision,
+    'magnesium', magnesium::double precision,
+    'phosphorus', phosphorus::double precision,
+    'potassium', potassium::double precision,
+    'zinc', zinc::double precision
+));
+ALTER TABLE nutritional_analyses
+    DROP COLUMN calories,
+    DROP COLUMN protein,
+    DROP COLUMN carbohydrates,
+    DROP COLUMN total_fat,
+    DROP COLUMN saturated_fat,
+    DROP COLUMN fiber,
+    DROP COLUMN sugar,
+    DROP COLUMN sodium,
+    DROP COLUMN vitamin_a,
+    DROP COLUMN vitamin_c,
+    DROP COLUMN vitamin_d,
+    DROP COLUMN vitamin_e,
+    DROP COLUMN vitamin_k,
+    DROP COLUMN vitamin_b1,
+    DROP COLUMN vitamin_b2,
+    DROP COLUMN vitamin_b3,
+    DROP COLUMN vitamin_b6,
+    DROP COLUMN vitamin_b12,
+    DROP COLUMN folate,
+    DROP COLUMN calcium,
+    DROP COLUMN iron,
+    DROP COLUMN magnesium,
+    DROP COLUMN phosphorus,
+    DROP COLUMN potassium,
+    DROP COLUMN zinc,
+    ALTER COLUMN estimated_weight TYPE double precision,
+    ALTER COLUMN status DROP DEFAULT,
+    ALTER COLUMN status TYPE analysis_status USING lower(status::text)::analysis_status,
+    ALTER COLUMN status SET DEFAULT 'pending',
+    ALTER COLUMN raw_response TYPE jsonb USING NULLIF(raw_response::jsonb, 'null'::jsonb),
+    ALTER COLUMN created_at TYPE timestamptz USING created_at AT TIME ZONE 'UTC',
+    ALTER COLUMN created_at SET DEFAULT now(),
+    ALTER COLUMN updated_at TYPE timestamptz USING updated_at AT TIME ZONE 'UTC',
+    ALTER COLUMN updated_at SET DEFAULT now(),
+    ADD COLUMN allergen_names json NOT NULL DEFAULT '[]',
+    ADD COLUMN has_common_allergens boolean NOT NULL DEFAULT false;
+ALTER TABLE nutritional_analyses ALTER COLUMN has_common_allergens DROP DEFAULT;
+
+-- lz4 where the server supports it; builds without lz4 and PostgreSQL 13 and older keep pglz
+DO $$
+BEGIN
+    ALTER TABLE nutritional_analyses ALTER COLUMN raw_response SET COMPRESSION lz4;
+EXCEPTION WHEN feature_not_supported OR syntax_error THEN
+    NULL;
+END
+$$;
+
+-- Shared primary key: analyses are keyed by food_image_id; links are re-pointed before id goes away
+ALTER TABLE analysis_allergens DROP CONSTRAINT analysis_allergens_analysis_id_fkey;
+UPDATE analysis_allergens aa
+SET analysis_id = na.food_image_id
+FROM nutritional_analyses na
+WHERE aa.analysis_id = na.id;
+ALTER TABLE nutritional_analyses
+    DROP CONSTRAINT nutritional_analyses_pkey,
+    DROP CONSTRAINT nutritional_analyses_food_image_id_key,
+    DROP COLUMN id,
+    ADD CONSTRAINT nutritional_analyses_pkey PRIMARY KEY (food_image_id),
+    ALTER COLUMN food_image_id DROP DEFAULT;
+ALTER TABLE analysis_allergens
+    ADD CONSTRAINT analysis_allergens_analysis_id_fkey
+    FOREIGN KEY (analysis_id) REFERENCES nutritional_analyses (food_image_id);
+
+-- analysis_allergens / user_allergens: severity enum and server defaults
+ALTER TABLE analysis_allergens
+    ALTER COLUMN severity TYPE allergen_severity USING lower(severity::text)::allergen_severity,
+    ALTER COLUMN severity SET DEFAULT 'low',
+    ALTER COLUMN detected_at TYPE timestamptz USING detected_at AT TIME ZONE 'UTC',
+    ALTER COLUMN detected_at SET DEFAULT now();
+ALTER TABLE user_allergens
+    ALTER COLUMN severity TYPE allergen_severity USING lower(severity::text)::allergen_severity,
+    ALTER COLUMN severity SET DEFAULT 'medium',
+    ALTER COLUMN created_at TYPE timestamptz USING created_at AT TIME ZONE 'UTC',
+    ALTER COLUMN created_at SET DEFAULT now();
+
+DROP TYPE analysisstatus;
+DROP TYPE allergenseverity;
+
+-- Denormalized allergen fields (same statement as analysis_service.backfill_allergen_fields)
+UPDATE nutritional_analyses na
+SET allergen_names = COALESCE(
+    (
+        SELECT json_agg(a.name ORDER BY a.name)
+        FROM analysis_allergens aa
+        JOIN allergens a ON a.id = aa.allergen_id
+        WHERE aa.analysis_id = na.food_image_id
+    ),
+    '[]'::json
+),
+has_common_allergens = EXISTS (
+    SELECT 1
+    FROM analysis_allergens aa
+    JOIN allergens a ON a.id = aa.allergen_id
+    WHERE aa.analysis_id = na.food_image_id AND a.is_common
+);
+
+-- Indexes
+CREATE INDEX ix_nutritional_analyses_has_common_allergens ON nutritional_analyses (has_common_allergens);
+CREATE INDEX ix_nutritional_analyses_nutrients ON nutritional_analyses USING gin (nutrients);
+CREATE INDEX ix_nutritional_analyses_pending_created_at ON nutritional_analyses (created_at)
+    WHERE status IN ('pending', 'processing');
+CREATE UNIQUE INDEX ix_analysis_allergens_analysis_id_allergen_id ON analysis_allergens (analysis_id, allergen_id);
+CREATE INDEX ix_analysis_allergens_allergen_id_analysis_id ON analysis_allergens (allergen_id, analysis_id);
+CREATE UNIQUE INDEX ix_user_allergens_user_id_allergen_id ON user_allergens (user_id, allergen_id);
+CREATE INDEX ix_user_allergens_allergen_id_user_id ON user_allergens (allergen_id, user_id);
+
+-- Dashboard view (app.models.ANALYSIS_SUMMARY_VIEW_DDL)
+CREATE MATERIALIZED VIEW analysis_summary AS
+SELECT
+    na.food_image_id,
+    na.food_name,
+    (na.nutrients ->> 'calories')::double precision AS calories,
+    fi.user_id,
+    fi.uploaded_at,
+    COALESCE(array_agg(a.name ORDER BY a.name) FILTER (WHERE a.name IS NOT NULL), ARRAY[]::varchar[])
+        AS allergen_names
+FROM nutritional_analyses na
+JOIN food_images fi ON fi.id = na.food_image_id
+LEFT JOIN analysis_allergens aa ON aa.analysis_id = na.food_image_id
+LEFT JOIN allergens a ON a.id = aa.allergen_id
+GROUP BY na.food_image_id, fi.user_id, fi.uploaded_at
+WITH NO DATA;
+CREATE UNIQUE INDEX ix_analysis_summary_food_image_id ON analysis_summary (food_image_id);
+CREATE INDEX ix_analysis_summary_user_id_uploaded_at ON analysis_summary (user_id, uploaded_at DESC);
+REFRESH MATERIALIZED VIEW analysis_summary;
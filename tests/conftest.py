@@ -1,7 +1,13 @@
-from typing import Generator
+import itertools
+from typing import AsyncGenerator, Callable, Generator, List, Optional
 import pytest
+from sqlalchemy import event
+from app.allergen_service import clear_allergen_caches
+from app.database import ASYNC_ENGINE, ENGINE, get_async_session, get_session, reset_db
+from app.models import FoodImage, MimeType, User as UserModel
 from app.startup import startup
 from nicegui.testing import User
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 pytest_plugins = ["nicegui.testing.plugin"]
 
@@ -10,3 +16,65 @@ pytest_plugins = ["nicegui.testing.plugin"]
 def user(user: User) -> Generator[User, None, None]:
     startup()
     yield user
+
+
+@pytest.fixture()
+def clean_db() -> Generator[None, None, None]:
+    """Reset database for each test"""
+    reset_db()
+    clear_allergen_caches()
+    yield
+    reset_db()
+    clear_allergen_caches()
+
+
+@pytest.fixture()
+def add_image(clean_db) -> Callable[..., int]:
+    """Factory that commits one food image, owned by a new user unless user_id is given, and returns its id"""
+    counter = itertools.count(1)
+
+    def add(user_id: Optional[int] = None, mime_type: MimeType = MimeType.JPEG) -> int:
+        n = next(counter)
+        with get_session() as session:
+            if user_id is None:
+                owner = UserModel(username=f"owner{n}", email=f"owner{n}@example.com")
+                session.add(owner)
+                session.flush()
+                user_id = owner.id
+            if user_id is None:
+                raise ValueError("User was not persisted")
+            image = FoodImage(
+                user_id=user_id,
+                filename=f"image_{n}",
+                file_path=f"/uploads/image_{n}",
+                file_size=10,
+                mime_type=mime_type,
+            )
+            session.add(image)
+            session.commit()
+            if image.id is None:
+                raise ValueError("Image was not persisted")
+            return image.id
+
+    return add
+
+
+@pytest.fixture()
+def query_counter() -> Generator[List[str], None, None]:
+    """Collect every SQL statement sent to the engine while the test runs"""
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(ENGINE, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(ENGINE, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture()
+async def async_session() -> AsyncGenerator[AsyncSession, None]:
+    """AsyncSession for the test; pooled asyncpg connections are bound to this test's event loop, so drop them after"""
+    async with get_async_session() as session:
+        yield session
+    await ASYNC_ENGINE.dispose()
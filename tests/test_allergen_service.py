@@ -0,0 +1,63 @@
+"""Database-backed tests for the allergen reference cache."""
+
+import pytest
+from sqlmodel import select
+
+from app.allergen_service import allergen_name_to_id, common_allergen_ids, create_allergen, resolve_allergen_ids
+from app.database import bulk_insert, get_session
+from app.models import Allergen, AllergenCreate
+
+
+@pytest.mark.sqlmodel
+def test_allergen_lookup_is_cached_until_create(clean_db, query_counter):
+    with get_session() as session:
+        peanuts = create_allergen(session, AllergenCreate(name="Peanuts", is_common=True))
+
+        assert allergen_name_to_id() == {"Peanuts": peanuts.id}
+        query_counter.clear()
+        assert resolve_allergen_ids(["Peanuts"]) == {"Peanuts": peanuts.id}
+        assert query_counter == []
+
+        sesame = create_allergen(session, AllergenCreate(name="Sesame"))
+        assert allergen_name_to_id() == {"Peanuts": peanuts.id, "Sesame": sesame.id}
+    assert common_allergen_ids() == {peanuts.id}
+
+
+@pytest.mark.sqlmodel
+def test_resolve_allergen_ids_skips_unknown_names(clean_db):
+    with get_session() as session:
+        create_allergen(session, AllergenCreate(name="Milk"))
+        milk = session.exec(select(Allergen).where(Allergen.name == "Milk")).one()
+
+    assert resolve_allergen_ids(["Milk", "Kryptonite"]) == {"Milk": milk.id}
+    assert resolve_allergen_ids([]) == {}
+
+
+@pytest.mark.sqlmodel
+def test_resolve_allergen_ids_reloads_on_miss(clean_db):
+    with get_session() as session:
+        create_allergen(session, AllergenCreate(name="Milk"))
+        assert resolve_allergen_ids(["Milk"]) == {"Milk": allergen_name_to_id()["Milk"]}
+        assert common_allergen_ids() == frozenset()
+
+        # Added behind the cache's back, as another worker would
+        bulk_insert(session, Allergen, [{"name": "Sesame", "is_common": True}])
+        session.commit()
+        sesame = session.exec(select(Allergen).where(Allergen.name == "Sesame")).one()
+
+    assert resolve_allergen_ids(["Sesame"]) == {"Sesame": sesame.id}
+    assert common_allergen_ids() == {sesame.id}
+
+
+@pytest.mark.sqlmodel
+def test_unknown_allergen_names_reload_once(clean_db, query_counter):
+    with get_session() as session:
+        milk = create_allergen(session, AllergenCreate(name="Milk"))
+        assert resolve_allergen_ids(["Milk", "Kryptonite"]) == {"Milk": milk.id}
+
+        query_counter.clear()
+        assert resolve_allergen_ids(["Kryptonite", "Milk"]) == {"Milk": milk.id}
+        assert query_counter == []
+
+        kryptonite = create_allergen(session, AllergenCreate(name="Kryptonite"))
+    assert resolve_allergen_ids(["Kryptonite"]) == {"Kryptonite": kryptonite.id}
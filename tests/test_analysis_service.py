@@ -0,0 +1,461 @@
+"""Database-backed tests for nutritional analysis loading and serialization."""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+
+import orjson
+import pytest
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from sqlalchemy.orm.attributes import instance_state
+from sqlmodel import desc, select, text
+
+from app.allergen_service import allergen_name_to_id, common_allergen_ids, create_allergen
+from app.analysis_service import (
+    add_analysis_allergen,
+    backfill_allergen_fields,
+    claim_pending_analyses,
+    create_analysis,
+    dump_user_analyses,
+    get_analysis_async,
+    get_analysis_response,
+    get_recent_summaries,
+    list_user_analyses,
+    list_user_analyses_async,
+    refresh_analysis_summary,
+    remove_analysis_allergen,
+)
+from app.database import bulk_insert, get_session
+from app.models import (
+    Allergen,
+    AllergenCreate,
+    AllergenSeverity,
+    AnalysisAllergen,
+    AnalysisAllergenCreate,
+    AnalysisStatus,
+    FoodImage,
+    MimeType,
+    NutritionalAnalysis,
+    NutritionalAnalysisCreate,
+    NutritionalAnalysisResponse,
+    RESPONSE_COLUMNS,
+    User,
+    UserAllergen,
+    analysis_list_options,
+)
+
+
+def _seed_analyses(count: int) -> int:
+    with get_session() as session:
+        user = User(username="tester", email="tester@example.com")
+        peanuts = Allergen(name="Peanuts", is_common=True)
+        milk = Allergen(name="Milk", is_common=True)
+        session.add_all([user, peanuts, milk])
+        session.commit()
+        session.refresh(user)
+        if user.id is None:
+            raise ValueError("User was not persisted")
+        user_id = user.id
+
+        for i in range(count):
+            image = FoodImage(
+                user_id=user_id,
+                filename=f"meal_{i}.jpg",
+                file_path=f"/uploads/meal_{i}.jpg",
+                file_size=1024,
+                mime_type=MimeType.JPEG,
+            )
+            session.add(image)
+            session.flush()
+            if image.id is None:
+                raise ValueError("Image was not persisted")
+            analysis = NutritionalAnalysis(food_image_id=image.id, food_name=f"Meal {i}")
+            session.add(analysis)
+            session.commit()
+            session.refresh(analysis)
+            if peanuts.id is None or milk.id is None:
+                raise ValueError("Seed data was not persisted")
+            analysis_id = analysis.food_image_id
+            add_analysis_allergen(session, AnalysisAllergenCreate(analysis_id=analysis_id, allergen_id=peanuts.id))
+            add_analysis_allergen(session, AnalysisAllergenCreate(analysis_id=analysis_id, allergen_id=milk.id))
+
+        return user_id
+
+
+@pytest.mark.sqlmodel
+def test_allergen_relationships_load_with_constant_queries(clean_db, query_counter):
+    _seed_analyses(5)
+    query_counter.clear()
+
+    with get_session() as session:
+        analyses = session.exec(select(NutritionalAnalysis)).all()
+        names = [sorted(link.allergen.name for link in analysis.allergens) for analysis in analyses]
+
+    assert names == [["Milk", "Peanuts"]] * 5
+    assert len(query_counter) <= 2
+
+
+@pytest.mark.sqlmodel
+def test_list_user_analyses_reads_denormalized_allergens(clean_db, query_counter):
+    user_id = _seed_analyses(3)
+    query_counter.clear()
+
+    with get_session() as session:
+        responses = list_user_analyses(session, user_id)
+
+    assert len(responses) == 3
+    assert all(response.allergens == ["Milk", "Peanuts"] for response in responses)
+    assert len(query_counter) == 1
+    assert "raw_response" not in query_counter[0]
+
+
+@pytest.mark.sqlmodel
+def test_list_user_analyses_unknown_user(clean_db):
+    _seed_analyses(1)
+
+    with get_session() as session:
+        assert list_user_analyses(session, user_id=9999) == []
+
+
+@pytest.mark.sqlmodel
+def test_analysis_list_options_raise_on_unplanned_lazy_load(clean_db):
+    _seed_analyses(1)
+
+    with get_session() as session:
+        analysis = session.exec(select(NutritionalAnalysis).options(*analysis_list_options())).one()
+        with pytest.raises(InvalidRequestError):
+            _ = analysis.food_image
+        with pytest.raises(InvalidRequestError):
+            _ = analysis.raw_response
+
+
+@pytest.mark.sqlmodel
+def test_get_analysis_response_reads_one_row(clean_db, query_counter):
+    user_id = _seed_analyses(2)
+    with get_session() as session:
+        listed = list_user_analyses(session, user_id)[0]
+        assert listed.id == listed.food_image_id
+        query_counter.clear()
+
+        assert get_analysis_response(session, listed.food_image_id) == listed
+        assert get_analysis_response(session, 9999) is None
+
+    assert len(query_counter) == 2
+    assert "raw_response" not in query_counter[0]
+
+
+@pytest.mark.sqlmodel
+def test_remove_analysis_allergen_updates_names(clean_db):
+    _seed_analyses(1)
+
+    with get_session() as session:
+        link = session.exec(select(AnalysisAllergen).join(Allergen).where(Allergen.name == "Milk")).one()
+        if link.id is None:
+            raise ValueError("Link was not persisted")
+        assert remove_analysis_allergen(session, link.id)
+        assert not remove_analysis_allergen(session, link.id)
+
+        analysis = session.exec(select(NutritionalAnalysis)).one()
+        assert analysis.allergen_names == ["Peanuts"]
+        assert analysis.has_common_allergens
+
+
+@pytest.mark.sqlmodel
+def test_backfill_allergen_fields(clean_db, query_counter):
+    _seed_analyses(2)
+
+    with get_session() as session:
+        for analysis in session.exec(select(NutritionalAnalysis)).all():
+            analysis.allergen_names = []
+            analysis.has_common_allergens = False
+            session.add(analysis)
+        session.commit()
+
+        query_counter.clear()
+        assert backfill_allergen_fields(session) == 2
+        assert query_counter[0] == "SET LOCAL statement_timeout = 0"
+        assert query_counter[1].lstrip().startswith("UPDATE nutritional_analyses")
+        analyses = session.exec(select(NutritionalAnalysis)).all()
+        assert [analysis.allergen_names for analysis in analyses] == [["Milk", "Peanuts"]] * 2
+        assert all(analysis.has_common_allergens for analysis in analyses)
+
+
+@pytest.mark.sqlmodel
+def test_create_analysis_stores_only_detected_nutrients(clean_db, add_image):
+    with get_session() as session:
+        image_id = add_image(mime_type=MimeType.PNG)
+
+        analysis = create_analysis(
+            session,
+            NutritionalAnalysisCreate(food_image_id=image_id, food_name="Orange", calories=47.0, vitamin_c=53.2),
+        )
+
+        assert analysis.nutrients == {"calories": 47.0, "vitamin_c": 53.2}
+        assert analysis.calories == 47.0
+        assert analysis.iron is None
+
+        with_vitamin_c = session.exec(
+            select(NutritionalAnalysis).where(NutritionalAnalysis.nutrients.has_key("vitamin_c"))  # type: ignore[attr-defined]
+        ).all()
+        assert [row.food_name for row in with_vitamin_c] == ["Orange"]
+
+
+@pytest.mark.sqlmodel
+def test_duplicate_analysis_allergen_is_rejected(clean_db):
+    _seed_analyses(1)
+
+    with get_session() as session:
+        link = session.exec(select(AnalysisAllergen)).first()
+        if link is None:
+            raise ValueError("Seed data missing")
+
+        with pytest.raises(IntegrityError):
+            add_analysis_allergen(
+                session, AnalysisAllergenCreate(analysis_id=link.analysis_id, allergen_id=link.allergen_id)
+            )
+
+
+@pytest.mark.sqlmodel
+def test_create_analysis_resolves_allergens_without_lookups(clean_db, add_image, query_counter):
+    with get_session() as session:
+        image_id = add_image()
+        for name in ("Eggs", "Milk", "Soy", "Wheat"):
+            create_allergen(session, AllergenCreate(name=name, is_common=name == "Milk"))
+        allergen_name_to_id()
+        common_allergen_ids()
+
+        query_counter.clear()
+        analysis = create_analysis(
+            session, NutritionalAnalysisCreate(food_image_id=image_id), ["Wheat", "Milk", "Unobtainium", "Eggs", "Soy"]
+        )
+
+        link_inserts = [sql for sql in query_counter if sql.startswith("INSERT INTO analysis_allergens")]
+        assert len(link_inserts) == 1
+        # Only the unknown name costs anything: one reload of the allergen cache, never a per-allergen query
+        assert len([sql for sql in query_counter if "FROM allergens" in sql]) == 2
+        assert analysis.allergen_names == ["Eggs", "Milk", "Soy", "Wheat"]
+        assert analysis.has_common_allergens
+        assert len(analysis.allergens) == 4
+        assert all(link.severity == AllergenSeverity.LOW for link in analysis.allergens)
+
+        # The same unknown name on the next ingest does not reload again
+        query_counter.clear()
+        again = create_analysis(session, NutritionalAnalysisCreate(food_image_id=add_image()), ["Unobtainium", "Soy"])
+        assert not [sql for sql in query_counter if "FROM allergens" in sql]
+        assert again.allergen_names == ["Soy"]
+
+
+@pytest.mark.sqlmodel
+def test_bulk_insert_pages_rows(clean_db, query_counter):
+    with get_session() as session:
+        bulk_insert(session, Allergen, [{"name": f"Allergen {i}"} for i in range(5)], page_size=2)
+        session.commit()
+
+        assert len([sql for sql in query_counter if sql.startswith("INSERT INTO allergens")]) == 3
+        assert len(session.exec(select(Allergen)).all()) == 5
+
+
+@pytest.mark.sqlmodel
+def test_bulk_insert_fills_status_and_severity_defaults(clean_db, add_image):
+    user_id = _seed_analyses(0)
+
+    with get_session() as session:
+        image_id = add_image(user_id)
+        peanuts_id = allergen_name_to_id()["Peanuts"]
+
+        bulk_insert(session, NutritionalAnalysis, [{"food_image_id": image_id, "food_name": "bulk"}])
+        bulk_insert(session, AnalysisAllergen, [{"analysis_id": image_id, "allergen_id": peanuts_id}])
+        bulk_insert(session, UserAllergen, [{"user_id": user_id, "allergen_id": peanuts_id}])
+        session.execute(
+            text("INSERT INTO user_allergens (user_id, allergen_id) VALUES (:user_id, :allergen_id)"),
+            {"user_id": user_id, "allergen_id": allergen_name_to_id()["Milk"]},
+        )
+        session.commit()
+
+        assert session.exec(select(NutritionalAnalysis.status)).one() == AnalysisStatus.PENDING
+        assert session.exec(select(AnalysisAllergen.severity)).one() == AllergenSeverity.LOW
+        assert set(session.exec(select(UserAllergen.severity)).all()) == {AllergenSeverity.MEDIUM}
+
+
+@pytest.mark.sqlmodel
+def test_core_inserted_analysis_lists_empty_allergens(clean_db, add_image):
+    user_id = _seed_analyses(0)
+
+    with get_session() as session:
+        image_id = add_image(user_id)
+        bulk_insert(session, NutritionalAnalysis, [{"food_image_id": image_id, "food_name": "bulk"}])
+        session.commit()
+
+        assert [response.allergens for response in list_user_analyses(session, user_id)] == [[]]
+        assert orjson.loads(dump_user_analyses(session, user_id))[0]["allergens"] == []
+
+
+@pytest.mark.sqlmodel
+def test_bulk_insert_empty_rows_is_noop(clean_db, query_counter):
+    with get_session() as session:
+        bulk_insert(session, Allergen, [])
+
+    assert query_counter == []
+
+
+@pytest.mark.sqlmodel
+def test_analysis_summary_reflects_last_refresh(clean_db, add_image, query_counter):
+    user_id = _seed_analyses(2)
+
+    with get_session() as session:
+        query_counter.clear()
+        refresh_analysis_summary(session)
+        assert query_counter == [
+            "SET LOCAL statement_timeout = 0",
+            "REFRESH MATERIALIZED VIEW CONCURRENTLY analysis_summary",
+        ]
+        assert len(get_recent_summaries(session, user_id)) == 2
+
+        image_id = add_image(user_id)
+        create_analysis(session, NutritionalAnalysisCreate(food_image_id=image_id, food_name="Apple", calories=52.0))
+
+        assert len(get_recent_summaries(session, user_id)) == 2
+
+        refresh_analysis_summary(session)
+        summaries = get_recent_summaries(session, user_id)
+
+    assert len(summaries) == 3
+    apple = next(summary for summary in summaries if summary.food_name == "Apple")
+    assert apple.calories == 52.0
+    assert apple.allergen_names == []
+    assert all(summary.allergen_names == ["Milk", "Peanuts"] for summary in summaries if summary is not apple)
+
+
+@pytest.mark.sqlmodel
+def test_analysis_responses_are_frozen(clean_db):
+    user_id = _seed_analyses(1)
+
+    with get_session() as session:
+        response = list_user_analyses(session, user_id)[0]
+
+    assert response.food_name == "Meal 0"
+    assert datetime.fromisoformat(response.model_dump(mode="json")["created_at"]) == response.created_at
+    with pytest.raises(ValidationError):
+        response.food_name = "Changed"  # type: ignore[misc]
+
+
+@pytest.mark.sqlmodel
+def test_claim_pending_analyses_takes_each_row_once(clean_db, query_counter):
+    _seed_analyses(3)
+
+    with get_session() as session:
+        done = session.exec(select(NutritionalAnalysis).where(NutritionalAnalysis.food_name == "Meal 1")).one()
+        done.status = AnalysisStatus.COMPLETED
+        session.add(done)
+        session.commit()
+
+        loaded = session.exec(select(NutritionalAnalysis).where(NutritionalAnalysis.food_name == "Meal 0")).one()
+        assert len(loaded.allergens) == 2
+
+        query_counter.clear()
+        claimed = claim_pending_analyses(session, limit=5)
+
+        assert [analysis.food_name for analysis in claimed] == ["Meal 0", "Meal 2"]
+        assert all(analysis.status == AnalysisStatus.PROCESSING for analysis in claimed)
+        # UPDATE ... RETURNING, the SELECT of the claimed rows and the selectin load of their links
+        assert len(query_counter) == 3
+        assert not any("raw_response" in sql for sql in query_counter)
+
+        query_counter.clear()
+        assert all(
+            sorted(link.allergen.name for link in analysis.allergens) == ["Milk", "Peanuts"] for analysis in claimed
+        )
+        assert claimed[0] is loaded
+        assert query_counter == []
+        assert claim_pending_analyses(session, limit=5) == []
+
+
+@pytest.mark.sqlmodel
+def test_list_user_analyses_extracts_response_nutrients(clean_db, add_image):
+    user_id = _seed_analyses(1)
+
+    with get_session() as session:
+        image_id = add_image(user_id)
+        create_analysis(
+            session,
+            NutritionalAnalysisCreate(
+                food_image_id=image_id, food_name="Spinach", calories=23.0, iron=2.7, vitamin_k=483.0
+            ),
+        )
+
+        responses = list_user_analyses(session, user_id)
+
+    spinach = next(response for response in responses if response.food_name == "Spinach")
+    assert spinach.calories == 23.0
+    assert spinach.iron == 2.7
+    assert spinach.protein is None
+    assert spinach.allergens == []
+    assert not spinach.has_common_allergens
+
+
+@pytest.mark.sqlmodel
+def test_unvalidated_responses_match_validated_ones(clean_db):
+    user_id = _seed_analyses(2)
+
+    with get_session() as session:
+        responses = list_user_analyses(session, user_id)
+        rows = session.exec(select(*RESPONSE_COLUMNS).order_by(desc(NutritionalAnalysis.created_at))).all()
+
+    assert responses == [NutritionalAnalysisResponse.model_validate(row) for row in rows]
+
+
+@pytest.mark.sqlmodel
+def test_dump_user_analyses_matches_response_json(clean_db):
+    user_id = _seed_analyses(2)
+
+    with get_session() as session:
+        analysis = session.exec(select(NutritionalAnalysis)).first()
+        if analysis is None:
+            raise ValueError("Seed data was not persisted")
+        analysis.confidence_score = Decimal("0.9500")
+        analysis.calories = 250.0
+        session.add(analysis)
+        session.commit()
+
+        expected = TypeAdapter(List[NutritionalAnalysisResponse]).dump_json(list_user_analyses(session, user_id))
+        assert dump_user_analyses(session, user_id) == expected
+
+
+@pytest.mark.sqlmodel
+def test_has_common_allergens_tracks_links(clean_db, add_image):
+    with get_session() as session:
+        image_id = add_image()
+        create_allergen(session, AllergenCreate(name="Lupin"))
+        sesame = create_allergen(session, AllergenCreate(name="Sesame", is_common=True))
+        if sesame.id is None:
+            raise ValueError("Allergen was not persisted")
+
+        analysis = create_analysis(session, NutritionalAnalysisCreate(food_image_id=image_id), ["Lupin"])
+        assert not analysis.has_common_allergens
+
+        link = add_analysis_allergen(session, AnalysisAllergenCreate(analysis_id=image_id, allergen_id=sesame.id))
+        session.refresh(analysis)
+        assert analysis.has_common_allergens
+
+        if link.id is None:
+            raise ValueError("Link was not persisted")
+        remove_analysis_allergen(session, link.id)
+        session.refresh(analysis)
+        assert not analysis.has_common_allergens
+
+
+@pytest.mark.sqlmodel
+async def test_async_session_lists_and_awaits_relationships(clean_db, async_session):
+    user_id = _seed_analyses(2)
+    with get_session() as session:
+        expected = list_user_analyses(session, user_id)
+
+    assert await list_user_analyses_async(async_session, user_id) == expected
+
+    analysis = await get_analysis_async(async_session, expected[0].food_image_id)
+    assert analysis is not None
+    assert "raw_response" in instance_state(analysis).unloaded
+    assert sorted(link.allergen.name for link in analysis.allergens) == ["Milk", "Peanuts"]
+    food_image = await analysis.awaitable_attrs.food_image
+    assert food_image.user_id == user_id
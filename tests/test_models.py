@@ -0,0 +1,191 @@
+"""Database-backed tests for column-level model behavior."""
+
+from decimal import Decimal
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select, text
+
+from app.database import bulk_insert, get_session
+from app.models import (
+    AllergenSeverity,
+    AnalysisStatus,
+    FoodImage,
+    FoodImageUpload,
+    MimeType,
+    NutritionalAnalysis,
+    User,
+    UserCreate,
+)
+
+
+@pytest.mark.sqlmodel
+def test_timestamps_are_filled_by_database(clean_db):
+    with get_session() as session:
+        user = User(username="alice", email="alice@example.com")
+        assert user.created_at is None
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+        created_at = user.created_at
+        assert created_at is not None
+        assert user.updated_at == created_at
+
+        user.full_name = "Alice Smith"
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+        assert user.created_at == created_at
+        assert user.updated_at is not None
+        assert user.updated_at > created_at
+
+
+@pytest.mark.sqlmodel
+def test_nutrient_values_round_trip_as_float(clean_db, add_image):
+    with get_session() as session:
+        image_id = add_image()
+        analysis = NutritionalAnalysis(food_image_id=image_id, calories=52.5, vitamin_c=4.6)
+        session.add(analysis)
+        session.commit()
+        session.refresh(analysis)
+
+        assert isinstance(analysis.calories, float)
+        assert analysis.calories == 52.5
+        assert analysis.vitamin_c == 4.6
+        assert analysis.protein is None
+        assert analysis.nutrients == {"calories": 52.5, "vitamin_c": 4.6}
+
+
+@pytest.mark.sqlmodel
+def test_decimal_nutrient_values_are_stored_as_float(clean_db, add_image):
+    with get_session() as session:
+        analysis = NutritionalAnalysis(food_image_id=add_image(), calories=Decimal("1.5"))
+        analysis.iron = Decimal("2.7")  # type: ignore[assignment]
+        session.add(analysis)
+        session.commit()
+        session.refresh(analysis)
+
+        assert analysis.nutrients == {"calories": 1.5, "iron": 2.7}
+
+
+@pytest.mark.sqlmodel
+def test_nutrients_round_trip_through_jsonb(clean_db, add_image):
+    with get_session() as session:
+        image_id = add_image()
+        analysis = NutritionalAnalysis(food_image_id=image_id, nutrients={"calories": 52.5, "vitamin_c": 4.6})
+        session.add(analysis)
+        session.commit()
+        session.refresh(analysis)
+
+        assert isinstance(analysis.calories, float)
+        assert analysis.calories == 52.5
+        assert analysis.vitamin_c == 4.6
+        assert analysis.protein is None
+
+        analysis.protein = 1.2
+        analysis.vitamin_c = None
+        session.add(analysis)
+        session.commit()
+        session.refresh(analysis)
+
+        assert analysis.nutrients == {"calories": 52.5, "protein": 1.2}
+
+
+@pytest.mark.sqlmodel
+def test_invalid_email_rejected_by_database(clean_db):
+    with get_session() as session:
+        session.add(User(username="eve", email="not-an-email"))
+        with pytest.raises(IntegrityError):
+            session.commit()
+
+
+def test_user_create_validates_email():
+    assert UserCreate(username="frank", email="frank@example.com").email == "frank@example.com"
+    with pytest.raises(ValidationError):
+        UserCreate(username="frank", email="frank@example")
+
+
+@pytest.mark.sqlmodel
+def test_enums_use_native_types_with_value_labels(clean_db, add_image):
+    with get_session() as session:
+        image_id = add_image()
+        analysis = NutritionalAnalysis(food_image_id=image_id, status=AnalysisStatus.PROCESSING)
+        session.add(analysis)
+        session.commit()
+        session.refresh(analysis)
+
+        assert analysis.status == AnalysisStatus.PROCESSING
+        row = session.execute(text("SELECT status::text, pg_typeof(status)::text FROM nutritional_analyses")).one()
+        assert tuple(row) == ("processing", "analysis_status")
+
+        labels = session.execute(
+            text(
+                "SELECT enumlabel FROM pg_enum JOIN pg_type ON pg_type.oid = enumtypid"
+                " WHERE typname = 'allergen_severity'"
+            )
+        ).scalars()
+        assert set(labels) == {severity.value for severity in AllergenSeverity}
+
+
+@pytest.mark.sqlmodel
+def test_mime_type_stored_as_native_enum(clean_db):
+    with get_session() as session:
+        user = User(username="ivan", email="ivan@example.com")
+        session.add(user)
+        session.flush()
+        # Plain content-type strings are accepted on the way in
+        row = {"user_id": user.id, "filename": "g.png", "file_path": "/uploads/g.png", "file_size": 10}
+        bulk_insert(session, FoodImage, [{**row, "mime_type": "image/png"}])
+        session.commit()
+
+        image = session.exec(select(FoodImage)).one()
+        assert image.mime_type is MimeType.PNG
+        column_type = session.execute(text("SELECT pg_typeof(mime_type)::text FROM food_images")).scalar()
+        assert column_type == "mime_type"
+
+
+def test_food_image_upload_rejects_unsupported_mime_type():
+    upload = {"filename": "a.jpg", "file_path": "/uploads/a.jpg", "file_size": 10}
+    assert FoodImageUpload.model_validate({**upload, "mime_type": "image/jpeg"}).mime_type is MimeType.JPEG
+    with pytest.raises(ValidationError):
+        FoodImageUpload.model_validate({**upload, "mime_type": "image/gif"})
+
+
+@pytest.mark.sqlmodel
+def test_raw_response_stored_as_jsonb(clean_db, add_image):
+    with get_session() as session:
+        image_id = add_image()
+        analysis = NutritionalAnalysis(
+            food_image_id=image_id, raw_response={"labels": [{"name": "salad", "score": 0.93}]}
+        )
+        session.add(analysis)
+        session.commit()
+        session.refresh(analysis)
+
+        assert analysis.raw_response == {"labels": [{"name": "salad", "score": 0.93}]}
+        column_type = session.execute(text("SELECT pg_typeof(raw_response)::text FROM nutritional_analyses")).scalar()
+        assert column_type == "jsonb"
+
+
+@pytest.mark.sqlmodel
+def test_raw_response_is_deferred_on_entity_loads(clean_db, add_image, query_counter):
+    image_id = add_image()
+    with get_session() as session:
+        session.add(NutritionalAnalysis(food_image_id=image_id, raw_response={"labels": []}))
+        session.commit()
+
+    with get_session() as session:
+        query_counter.clear()
+        image = session.exec(select(FoodImage)).one()
+        analysis = image.nutritional_analysis
+        assert analysis is not None
+        session.expunge_all()
+        loaded = session.get(NutritionalAnalysis, image_id)
+        assert loaded is not None
+        assert not any("raw_response" in sql for sql in query_counter)
+
+        assert loaded.raw_response == {"labels": []}
+        assert "raw_response" in query_counter[-1]